@@ -1,12 +1,16 @@
 import streamlit as st
 import pandas as pd
 import joblib
-import shap
+import xgboost as xgb
+import matplotlib
+matplotlib.use("Agg")  # Backend sans interface graphique (rendu PNG uniquement)
 import matplotlib.pyplot as plt
-import cohere
+from matplotlib.figure import Figure
 import io
-from fpdf import FPDF
 import unicodedata
+import functools
+import hashlib
+from datetime import datetime
 import os
 import numpy as np
 import warnings
@@ -21,65 +25,179 @@ plt.rcParams['font.sans-serif'] = ['Arial', 'DejaVu Sans', 'Liberation Sans']
 plt.rcParams['axes.unicode_minus'] = False
 plt.rcParams['text.usetex'] = False
 plt.rcParams['mathtext.default'] = 'regular'
+plt.rcParams.update({
+    'figure.max_open_warning': 0,
+    'path.simplify': True,
+    'path.simplify_threshold': 1.0,
+    'agg.path.chunksize': 10000
+})
+
+# -------------------------------
+# Variables du modèle (ordre d'entraînement)
+# -------------------------------
+COLS = (
+    'RevolvingUtilizationOfUnsecuredLines',
+    'age',
+    'NumberOfTime30-59DaysPastDueNotWorse',
+    'DebtRatio',
+    'MonthlyIncome',
+    'NumberOfOpenCreditLinesAndLoans',
+    'NumberOfTimes90DaysLate',
+    'NumberRealEstateLoansOrLines',
+    'NumberOfTime60-89DaysPastDueNotWorse',
+    'NumberOfDependents'
+)
+
+FEATURE_LABELS_FR = {
+    'RevolvingUtilizationOfUnsecuredLines': 'Utilisation crédit renouvelable',
+    'NumberOfTime30-59DaysPastDueNotWorse': 'Retards 30-59 jours',
+    'NumberOfTime60-89DaysPastDueNotWorse': 'Retards 60-89 jours',
+    'NumberOfTimes90DaysLate': 'Retards ≥90 jours',
+    'MonthlyIncome': 'Revenu mensuel',
+    'NumberOfOpenCreditLinesAndLoans': 'Crédits actifs',
+    'NumberRealEstateLoansOrLines': 'Prêts immobiliers',
+    'NumberOfDependents': 'Personnes à charge',
+    'DebtRatio': "Ratio d'endettement",
+    'age': 'Âge'
+}
+
+FEATURE_LABELS_EN = {
+    'RevolvingUtilizationOfUnsecuredLines': 'Revolving credit utilization',
+    'NumberOfTime30-59DaysPastDueNotWorse': '30-59 days late payments',
+    'NumberOfTime60-89DaysPastDueNotWorse': '60-89 days late payments',
+    'NumberOfTimes90DaysLate': '≥90 days late payments',
+    'MonthlyIncome': 'Monthly income',
+    'NumberOfOpenCreditLinesAndLoans': 'Open credit lines',
+    'NumberRealEstateLoansOrLines': 'Real estate loans',
+    'NumberOfDependents': 'Number of dependents',
+    'DebtRatio': 'Debt ratio',
+    'age': 'Age'
+}
+
+# Clés de traduction des colonnes de l'export Excel (ordre des colonnes)
+EXPORT_COLS = (
+    'age',
+    'income',
+    'debt_ratio',
+    'revolving',
+    'open_credit',
+    'real_estate',
+    'dependents',
+    'late_30',
+    'late_60',
+    'late_90'
+)
+
+# Noms des facteurs SHAP pour l'export Excel
+FEATURE_FR_MAP = {
+    'RevolvingUtilizationOfUnsecuredLines': 'Utilisation_Credit_Renouvelable',
+    'NumberOfTime30-59DaysPastDueNotWorse': 'Retards_30_59_jours',
+    'NumberOfTime60-89DaysPastDueNotWorse': 'Retards_60_89_jours',
+    'NumberOfTimes90DaysLate': 'Retards_90_jours_plus',
+    'MonthlyIncome': 'Revenu_Mensuel',
+    'NumberOfOpenCreditLinesAndLoans': 'Credits_Actifs',
+    'NumberRealEstateLoansOrLines': 'Prets_Immobiliers',
+    'NumberOfDependents': 'Personnes_Charge',
+    'DebtRatio': 'Ratio_Endettement',
+    'age': 'Age'
+}
+
+# Libellés courts pour l'axe du graphique SHAP
+FEATURE_LABELS_PLOT = {
+    'RevolvingUtilizationOfUnsecuredLines': 'Credit Util.',
+    'NumberOfTime30-59DaysPastDueNotWorse': 'Retards 30-59j',
+    'NumberOfTime60-89DaysPastDueNotWorse': 'Retards 60-89j',
+    'NumberOfTimes90DaysLate': 'Retards 90j+',
+    'MonthlyIncome': 'Revenu',
+    'NumberOfOpenCreditLinesAndLoans': 'Credits actifs',
+    'NumberRealEstateLoansOrLines': 'Prets immobiliers',
+    'NumberOfDependents': 'Dependants',
+    'DebtRatio': 'Ratio dette',
+    'age': 'Age'
+}
 
 # -------------------------------
 # OPTIMISATIONS DE PERFORMANCE
 # -------------------------------
 # Cache pour éviter de recharger le modèle à chaque fois
-@st.cache_resource
+@st.cache_resource(max_entries=1)
 def load_model():
     return joblib.load("models/xgb_model.pkl")
 
-# Cache pour l'explainer SHAP (très coûteux à créer)
-@st.cache_resource
-def get_shap_explainer(_model):
-    return shap.Explainer(_model)
-
-# Cache pour les prédictions (évite les recalculs inutiles)
-@st.cache_data
-def predict_client(age, income, dependents, open_credit, real_estate, debt_ratio, revolving, late_30, late_60, late_90):
-    client_df = pd.DataFrame([{
-        'RevolvingUtilizationOfUnsecuredLines': revolving / 100,
-        'age': age,
-        'NumberOfTime30-59DaysPastDueNotWorse': late_30,
-        'DebtRatio': debt_ratio,
-        'MonthlyIncome': income,
-        'NumberOfOpenCreditLinesAndLoans': open_credit,
-        'NumberOfTimes90DaysLate': late_90,
-        'NumberRealEstateLoansOrLines': real_estate,
-        'NumberOfTime60-89DaysPastDueNotWorse': late_60,
-        'NumberOfDependents': dependents
-    }])
-    
-    model = load_model()
-    proba = model.predict_proba(client_df)[0][1]
-    classe = model.predict(client_df)[0]
-    
-    return client_df, proba, classe
+# Cache pour le Booster XGBoost natif (prédiction et contributions TreeSHAP sans wrapper)
+@st.cache_resource(max_entries=1)
+def load_booster():
+    return load_model().get_booster()
 
-# Cache pour les calculs SHAP (très coûteux)
+# Cache pour la feuille de style (une seule lecture disque)
 @st.cache_data
-def compute_shap_values(age, income, dependents, open_credit, real_estate, debt_ratio, revolving, late_30, late_60, late_90):
-    client_df, _, _ = predict_client(age, income, dependents, open_credit, real_estate, debt_ratio, revolving, late_30, late_60, late_90)
-    model = load_model()
-    explainer = get_shap_explainer(model)
-    shap_values = explainer(client_df)
-    
-    # Retourner seulement les données nécessaires
+def load_theme_css():
+    # Chemin relatif au script, indépendant du répertoire de lancement
+    css_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "theme.css")
+    with open(css_path, encoding="utf-8") as f:
+        return f.read()
+
+# Quantification des entrées : des clés de cache stables pour st.cache_data
+def quantize_inputs(age, income, dependents, open_credit, real_estate, debt_ratio, revolving, late_30, late_60, late_90):
+    """Ramène les valeurs des sliders sur une grille discrète (clé de cache hashable)"""
+    return (
+        int(age),
+        int(income),
+        int(dependents),
+        int(open_credit),
+        int(real_estate),
+        round(float(debt_ratio), 1),
+        int(round(revolving)),
+        int(late_30),
+        int(late_60),
+        int(late_90)
+    )
+
+# Cache pour la prédiction + SHAP en un seul appel (évite les recalculs inutiles)
+@st.cache_data(max_entries=256, ttl=3600)
+def analyze_client(age, income, dependents, open_credit, real_estate, debt_ratio, revolving, late_30, late_60, late_90):
+    # Ligne NumPy dans l'ordre de COLS (pas de DataFrame pour une seule prédiction)
+    client_values = np.array([
+        revolving / 100, age, late_30, debt_ratio, income,
+        open_credit, late_90, real_estate, late_60, dependents
+    ])
+    row = client_values.astype(np.float32).reshape(1, -1)
+    
+    # Probabilité directement sur le tableau float32 (sans DMatrix ni wrapper sklearn)
+    booster = load_booster()
+    proba = float(booster.inplace_predict(row)[0])
+    classe = int(proba >= 0.5)
+    
+    # pred_contribs : valeurs TreeSHAP exactes, dernière colonne = valeur de base (ignorée)
+    dm = xgb.DMatrix(row, feature_names=list(COLS))
+    contribs = booster.predict(dm, pred_contribs=True)[0]
+    values = contribs[:-1]
+    
+    # Retourner seulement les données nécessaires, triées par impact absolu (tri NumPy)
+    order = np.argsort(-np.abs(values))
     shap_df = pd.DataFrame({
-        'feature': client_df.columns,
-        'shap_value': shap_values[0].values,
-        'value': client_df.iloc[0].values
-    }).sort_values(by='shap_value', key=abs, ascending=False)
+        'feature': np.asarray(COLS)[order],
+        'shap_value': values[order],
+        'value': client_values[order]
+    })
     
-    return shap_values[0], shap_df
+    return proba, classe, shap_df
+
+# Figure matplotlib unique par session (réutilisée au lieu d'être réallouée)
+def get_shap_figure():
+    if "shap_fig" not in st.session_state:
+        # Figure hors pyplot : libérée avec la session, sans plt.close()
+        fig = Figure(figsize=(7, 3.5))
+        st.session_state["shap_fig"] = (fig, fig.add_subplot())
+    return st.session_state["shap_fig"]
 
 # Fonction pour créer un graphique SHAP sécurisé
-def create_safe_shap_plot(shap_values, shap_df):
-    """Crée un graphique SHAP personnalisé sans utiliser tight_layout()"""
+def create_safe_shap_plot(shap_df, fig, ax):
+    """Dessine le graphique SHAP personnalisé dans une figure existante, sans tight_layout()"""
     try:
-        # Créer figure avec taille fixe
-        fig, ax = plt.subplots(figsize=(7, 3.5))
+        # Réinitialiser les axes de la figure réutilisée
+        ax.clear()
+        ax.axis('on')
         fig.patch.set_facecolor('#252c3d')
         ax.set_facecolor('#252c3d')
         
@@ -89,17 +207,8 @@ def create_safe_shap_plot(shap_values, shap_df):
         # Nettoyer les noms des features
         feature_names = []
         for fname in top_features['feature']:
-            clean_name = str(fname).replace('_', ' ')
-            clean_name = clean_name.replace('RevolvingUtilizationOfUnsecuredLines', 'Credit Util.')
-            clean_name = clean_name.replace('NumberOfTime30-59DaysPastDueNotWorse', 'Retards 30-59j')
-            clean_name = clean_name.replace('NumberOfTime60-89DaysPastDueNotWorse', 'Retards 60-89j')
-            clean_name = clean_name.replace('NumberOfTimes90DaysLate', 'Retards 90j+')
-            clean_name = clean_name.replace('MonthlyIncome', 'Revenu')
-            clean_name = clean_name.replace('NumberOfOpenCreditLinesAndLoans', 'Credits actifs')
-            clean_name = clean_name.replace('NumberRealEstateLoansOrLines', 'Prets immobiliers')
-            clean_name = clean_name.replace('NumberOfDependents', 'Dependants')
-            clean_name = clean_name.replace('DebtRatio', 'Ratio dette')
-            clean_name = clean_name.replace('age', 'Age')
+            # Noms de features exacts : simple recherche dans le dictionnaire
+            clean_name = FEATURE_LABELS_PLOT.get(fname, str(fname).replace('_', ' '))
             # Limiter la longueur
             if len(clean_name) > 15:
                 clean_name = clean_name[:12] + "..."
@@ -126,13 +235,13 @@ def create_safe_shap_plot(shap_values, shap_df):
         ax.axvline(x=0, color='white', linewidth=1.5, alpha=0.8)
         
         # Ajuster manuellement les marges au lieu d'utiliser tight_layout()
-        plt.subplots_adjust(left=0.25, right=0.95, top=0.9, bottom=0.15)
+        fig.subplots_adjust(left=0.25, right=0.95, top=0.9, bottom=0.15)
         
         return fig
         
     except Exception as e:
         # Graphique de fallback en cas d'erreur
-        fig, ax = plt.subplots(figsize=(7, 3.5))
+        ax.clear()
         fig.patch.set_facecolor('#252c3d')
         ax.set_facecolor('#252c3d')
         ax.text(0.5, 0.5, f'Graphique SHAP indisponible\nErreur: {str(e)[:50]}...', 
@@ -140,24 +249,33 @@ def create_safe_shap_plot(shap_values, shap_df):
         ax.set_xlim(0, 1)
         ax.set_ylim(0, 1)
         ax.axis('off')
-        plt.subplots_adjust(left=0.1, right=0.9, top=0.9, bottom=0.1)
+        fig.subplots_adjust(left=0.1, right=0.9, top=0.9, bottom=0.1)
         return fig
 
+# Cache du graphique SHAP rendu en PNG (aucun redessin matplotlib pour un état déjà vu)
+# _fig_ax : figure de la session, exclue de la clé de cache
+@st.cache_data(max_entries=256, ttl=3600)
+def render_shap_png(shap_df, _fig_ax):
+    fig, ax = _fig_ax
+    create_safe_shap_plot(shap_df, fig, ax)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=90, facecolor="#252c3d")
+    return buf.getvalue()
+
 # Fonction pour générer automatiquement le rapport IA basé sur les données actuelles
+# Cache : mêmes entrées quantifiées + même shap_df (hashé par contenu) => même texte
+@st.cache_data(max_entries=256)
 def generate_auto_ai_report(age, income, dependents, open_credit, real_estate, debt_ratio, revolving, late_30, late_60, late_90, proba, classe, shap_df, lang):
     # Rapport automatique basé sur les données
     risk_level = "élevé" if classe == 1 else "faible"
     income_fcfa = f"{income:,} FCFA"
     
     top_factors = shap_df.head(3)
-    factors_text = ""
-    for _, row in top_factors.iterrows():
-        impact = "augmente" if row['shap_value'] > 0 else "diminue"
-        feature_name = row['feature'].replace('RevolvingUtilizationOfUnsecuredLines', 'Crédit renouvelable')
-        feature_name = feature_name.replace('NumberOfTime30-59DaysPastDueNotWorse', 'Retards 30-59j')
-        feature_name = feature_name.replace('MonthlyIncome', 'Revenus mensuels')
-        feature_name = feature_name.replace('age', 'Âge')
-        factors_text += f"• {feature_name} {impact} le risque\n"
+    lines = []
+    for row in top_factors.itertuples(index=False):
+        impact = "augmente" if row.shap_value > 0 else "diminue"
+        lines.append(f"• {row.label} {impact} le risque")
+    factors_text = "\n".join(lines) + "\n"
     
     if lang == "fr":
         report = f"""📊 ANALYSE AUTOMATIQUE DU PROFIL CLIENT
@@ -195,12 +313,33 @@ def generate_auto_ai_report(age, income, dependents, open_credit, real_estate, d
     
     return report
 
+# Cache du bloc HTML "Score de Santé" (identique pour une même probabilité arrondie)
+@st.cache_data(max_entries=256)
+def score_html(proba):
+    score_sante = (1 - proba) * 100
+    if score_sante >= 80:
+        score_color = "🟢"
+        score_text = "Excellent"
+    elif score_sante >= 60:
+        score_color = "🟡"
+        score_text = "Correct"
+    else:
+        score_color = "🔴"
+        score_text = "Faible"
+    
+    return f'<div class="metric-container"><div class="metric-label">Score Financier</div><div class="metric-value">{score_color} {score_sante:.0f}/100</div><div style="color: var(--secondary-text); font-size: 0.8rem; margin-top: 0.3rem;">{score_text}</div></div>'
+
 # -------------------------------
 # Fonction pour retirer les accents (pour PDF)
 # -------------------------------
+@functools.lru_cache(maxsize=4096)
 def remove_accents(text):
     try:
-        return unicodedata.normalize('NFKD', str(text)).encode('ASCII', 'ignore').decode('utf-8')
+        text = str(text)
+        # Texte déjà ASCII : aucune normalisation nécessaire
+        if text.isascii():
+            return text
+        return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('utf-8')
     except:
         return str(text)
 
@@ -208,7 +347,7 @@ def remove_accents(text):
 # Fonction PDF alternative robuste
 # -------------------------------
 def create_pdf_report(age, income, proba, classe, report_text, tr):
-    """Crée un rapport PDF de manière robuste"""
+    """Crée un rapport PDF de manière robuste et renvoie ses bytes (ou None)"""
     try:
         from fpdf import FPDF
         
@@ -216,7 +355,7 @@ def create_pdf_report(age, income, proba, classe, report_text, tr):
             def header(self):
                 try:
                     self.set_font("Arial", "B", 14)
-                    title = remove_accents("RiskScore Pro - Rapport Credit")
+                    title = tr["pdf_report_title"]
                     self.cell(0, 10, title, ln=True, align="C")
                     self.ln(3)
                 except:
@@ -226,7 +365,7 @@ def create_pdf_report(age, income, proba, classe, report_text, tr):
                 try:
                     self.set_y(-15)
                     self.set_font("Arial", "I", 8)
-                    self.cell(0, 10, f"Page {self.page_no()}", align="C")
+                    self.cell(0, 10, f"{tr['page']} {self.page_no()}", align="C")
                 except:
                     pass
 
@@ -249,31 +388,30 @@ def create_pdf_report(age, income, proba, classe, report_text, tr):
             # Ajouter le rapport de manière sécurisée
             pdf.set_font("Arial", "", 9)
             
-            # Nettoyer et diviser le texte
+            # Nettoyer le texte en une seule passe, puis le diviser
             clean_report = remove_accents(str(report_text))
-            lines = clean_report.split('\n')
+            lines = [l for l in (ln.strip() for ln in clean_report.split('\n')) if l]
+            cell = pdf.cell  # Méthode liée hors de la boucle
             
             for line in lines:
-                line = line.strip()
-                if line:
-                    try:
-                        # Limiter à 90 caractères par ligne
-                        if len(line) > 90:
-                            words = line.split(' ')
-                            current_line = ""
-                            for word in words:
-                                if len(current_line + word) < 90:
-                                    current_line += word + " "
-                                else:
-                                    if current_line.strip():
-                                        pdf.cell(0, 5, current_line.strip(), ln=True)
-                                    current_line = word + " "
-                            if current_line.strip():
-                                pdf.cell(0, 5, current_line.strip(), ln=True)
-                        else:
-                            pdf.cell(0, 5, line, ln=True)
-                    except:
-                        continue
+                try:
+                    # Limiter à 90 caractères par ligne
+                    if len(line) > 90:
+                        words = line.split(' ')
+                        current_line = ""
+                        for word in words:
+                            if len(current_line + word) < 90:
+                                current_line += word + " "
+                            else:
+                                if current_line.strip():
+                                    cell(0, 5, current_line.strip(), ln=True)
+                                current_line = word + " "
+                        if current_line.strip():
+                            cell(0, 5, current_line.strip(), ln=True)
+                    else:
+                        cell(0, 5, line, ln=True)
+                except:
+                    continue
             
         except Exception as content_error:
             pdf.set_font("Arial", "", 10)
@@ -281,36 +419,70 @@ def create_pdf_report(age, income, proba, classe, report_text, tr):
             pdf.cell(0, 6, f"Analyse pour client de {age} ans", ln=True)
             pdf.cell(0, 6, f"Probabilite de defaut: {proba:.1%}", ln=True)
         
-        # Génération des bytes de manière compatible
+        # fpdf2 renvoie directement un bytearray (pas de str -> latin1 -> bytes)
         try:
-            # Méthode 1: fpdf2 récent
-            pdf_data = pdf.output()
-            if isinstance(pdf_data, str):
-                return io.BytesIO(pdf_data.encode('latin1'))
-            elif isinstance(pdf_data, (bytes, bytearray)):
-                return io.BytesIO(bytes(pdf_data))
-            else:
-                raise Exception("Format de sortie PDF non reconnu")
-                
+            return bytes(pdf.output())
         except Exception:
-            # Méthode 2: fpdf classique
-            try:
-                pdf_buffer = io.BytesIO()
-                pdf_string = pdf.output(dest='S')
-                if isinstance(pdf_string, str):
-                    pdf_buffer.write(pdf_string.encode('latin1'))
-                else:
-                    pdf_buffer.write(bytes(pdf_string))
-                pdf_buffer.seek(0)
-                return pdf_buffer
-            except Exception:
-                # Méthode 3: dernière tentative
-                return None
+            return None
                 
     except Exception as e:
         print(f"Erreur création PDF: {e}")
         return None
 
+# -------------------------------
+# PDF de secours : texte brut du rapport, sans mise en page
+# -------------------------------
+def create_fallback_pdf(report_text):
+    """Crée un PDF minimal mais valide contenant le texte du rapport"""
+    from fpdf import FPDF
+    
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", "", 9)
+    pdf.multi_cell(0, 5, remove_accents(report_text))
+    return bytes(pdf.output())
+
+# -------------------------------
+# Exports mis en cache (mêmes entrées => mêmes bytes)
+# -------------------------------
+# report_hash sert de clé ; _report (non hashé) est le texte exporté
+@st.cache_data(max_entries=32)
+def build_pdf_bytes(age, income, proba, classe, lang, report_hash, _report):
+    pdf_bytes = create_pdf_report(age, income, proba, classe, _report, T_ASCII[lang])
+    if pdf_bytes is None:
+        # Lever plutôt que renvoyer None : st.cache_data ne met pas les exceptions en cache
+        raise RuntimeError("Erreur génération PDF")
+    return pdf_bytes
+
+# shap_top : triplets (feature, shap_value, value) des 5 principaux facteurs, hashables
+@st.cache_data(max_entries=32)
+def build_xlsx_bytes(inputs, proba, classe, lang, shap_top, analysis_date):
+    tr = T[lang]
+    age, income, dependents, open_credit, real_estate, debt_ratio, revolving, late_30, late_60, late_90 = inputs
+    values = (age, income, debt_ratio, revolving, open_credit, real_estate, dependents, late_30, late_60, late_90)
+    row = {"Date_Analyse": analysis_date}
+    row.update(zip((tr[key] for key in EXPORT_COLS), values))
+    row[tr["default_prob"]] = f"{proba:.1%}"
+    row[tr["recommendation"]] = tr["acceptance"] if classe == 0 else tr["rejection"]
+    row["Niveau_Risque"] = tr["low_risk"] if classe == 0 else tr["high_risk"]
+    # Construction par colonnes (évite le chemin list-of-dict de pandas)
+    df_export = pd.DataFrame({col: [val] for col, val in row.items()})
+    
+    # Ajouter les facteurs SHAP de manière sécurisée
+    try:
+        shap_export = pd.DataFrame(list(shap_top), columns=['feature', 'shap_value', 'value'])
+        shap_export['feature'] = shap_export['feature'].map(FEATURE_FR_MAP).fillna(shap_export['feature'])
+    except:
+        shap_export = pd.DataFrame({'feature': ['age'], 'shap_value': [0.1], 'value': [age]})
+    
+    excel_buffer = io.BytesIO()
+    # in_memory : assemblage du classeur sans fichiers temporaires sur disque
+    with pd.ExcelWriter(excel_buffer, engine='xlsxwriter', datetime_format='yyyy-mm-dd',
+                        engine_kwargs={'options': {'in_memory': True}}) as writer:
+        df_export.to_excel(writer, index=False, sheet_name="Resultat_Client")
+        shap_export.to_excel(writer, index=False, sheet_name="Facteurs_Impact")
+    return excel_buffer.getvalue()
+
 # -------------------------------
 # Dictionnaire de traduction (modifié pour FCFA)
 # -------------------------------
@@ -321,6 +493,7 @@ T = {
         "header_title": "RiskScore Pro - Évaluation du Risque Crédit",
         "header_subtitle": "Plateforme d'analyse prédictive fondée sur XGBoost, SHAP & IA générative",
         "profile_client": "Profil Client",
+        "submit": "🔍 Analyser",
         "age": "Âge",
         "income": "Revenu mensuel (FCFA)",
         "dependents": "Personnes à charge",
@@ -350,9 +523,11 @@ T = {
         "generate_ai_report": "🤖 Générer rapport IA avancé",
         "missing_api_key": "⚠️ Clé API Cohere manquante dans st.secrets.",
         "ai_in_progress": "🔄 Analyse IA en cours...",
+        "downloads": "📥 Télécharger les rapports",
         "pdf_button": "📄 Télécharger PDF",
         "excel_button": "📊 Télécharger Excel",
         "pdf_title": "RiskScore Pro - Rapport IA",
+        "pdf_report_title": "RiskScore Pro - Rapport Crédit",
         "page": "Page",
         "prompt_template": """
 Analyse credit bancaire rapide pour ce client :
@@ -380,6 +555,7 @@ Max 80 mots, style professionnel bancaire.
         "header_title": "RiskScore Pro - Credit Risk Assessment",
         "header_subtitle": "Predictive analytics platform powered by XGBoost, SHAP & Generative AI",
         "profile_client": "Client Profile",
+        "submit": "🔍 Analyze",
         "age": "Age",
         "income": "Monthly income (FCFA)",
         "dependents": "Number of dependents",
@@ -409,9 +585,11 @@ Max 80 mots, style professionnel bancaire.
         "generate_ai_report": "🤖 Generate advanced AI Report",
         "missing_api_key": "⚠️ Missing Cohere API key in st.secrets.",
         "ai_in_progress": "🔄 AI analysis in progress...",
+        "downloads": "📥 Download reports",
         "pdf_button": "📄 Download PDF",
         "excel_button": "📊 Download Excel",
         "pdf_title": "RiskScore Pro - AI Report",
+        "pdf_report_title": "RiskScore Pro - Credit Report",
         "page": "Page",
         "prompt_template": """
 Banking credit analysis for this client:
@@ -438,15 +616,20 @@ Max 80 words, professional banking style.
 # -------------------------------
 # Détection langue via URL ?lang=fr ou ?lang=en
 # -------------------------------
-params = st.query_params
-lang_candidate = params.get("lang", ["fr"])
-if isinstance(lang_candidate, list):
-    lang_candidate = lang_candidate[0].lower()
-else:
-    lang_candidate = lang_candidate.lower()
-lang = lang_candidate if lang_candidate in ["fr", "en"] else "fr"
+lang = st.query_params.get("lang", "fr").lower()
+lang = lang if lang in T else "fr"
 tr = T[lang]
 
+# Copie sans accents des traductions, calculée une fois pour toutes les sessions (textes PDF)
+@st.cache_resource
+def get_ascii_translations():
+    return {
+        code: {k: remove_accents(v) if isinstance(v, str) else v for k, v in d.items()}
+        for code, d in T.items()
+    }
+
+T_ASCII = get_ascii_translations()
+
 # -------------------------------
 # Configuration page
 # -------------------------------
@@ -461,305 +644,7 @@ st.set_page_config(
 # -------------------------------
 # CSS thème sombre optimisé
 # -------------------------------
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
-    
-    /* Variables CSS pour cohérence des couleurs sombres */
-    :root {
-        --primary-bg: #0a0e1a;
-        --secondary-bg: #1a1f2e;
-        --card-bg: #252c3d;
-        --accent-bg: #2d3748;
-        --input-bg: #1e2532;
-        --primary-text: #ffffff;
-        --secondary-text: #b0b9c6;
-        --accent-color: #00d4ff;
-        --success-color: #48bb78;
-        --warning-color: #ed8936;
-        --danger-color: #f56565;
-        --border-color: #4a5568;
-        --hover-bg: #364152;
-    }
-    
-    * {
-        font-family: 'Inter', sans-serif !important; 
-        color: var(--primary-text) !important;
-    }
-    
-    body, .stApp, .main, .block-container {
-        background: linear-gradient(135deg, var(--primary-bg) 0%, var(--secondary-bg) 100%) !important;
-        padding: 0.5rem !important; 
-        margin: 0 !important; 
-    }
-    
-    .block-container {
-        max-width: 100% !important; 
-        padding: 0.5rem !important; 
-        margin: 0 !important;
-    }
-    
-    /* Header moderne sombre */
-    .header {
-        background: linear-gradient(135deg, var(--card-bg) 0%, var(--accent-bg) 100%);
-        padding: 1.2rem;
-        border-radius: 16px;
-        text-align: center;
-        margin-bottom: 1rem;
-        box-shadow: 0 4px 25px rgba(0, 212, 255, 0.15);
-        border: 1px solid rgba(0, 212, 255, 0.3);
-    }
-    
-    .header h1 {
-        color: var(--accent-color) !important;
-        font-size: 2.2rem;
-        font-weight: 700;
-        margin-bottom: 0.3rem;
-        text-shadow: 0 0 15px rgba(0, 212, 255, 0.4);
-    }
-    
-    .header p {
-        color: var(--secondary-text) !important;
-        font-size: 1rem;
-        margin-top: 0;
-        font-weight: 500;
-    }
-    
-    /* Conteneurs sombres améliorés */
-    .metric-container {
-        background: linear-gradient(135deg, var(--card-bg) 0%, var(--accent-bg) 100%);
-        border-radius: 12px;
-        padding: 1rem;
-        margin-bottom: 0.8rem;
-        text-align: center;
-        box-shadow: 0 3px 20px rgba(0, 0, 0, 0.4);
-        border: 1px solid var(--border-color);
-        transition: all 0.3s ease;
-    }
-    
-    .metric-container:hover {
-        transform: translateY(-3px);
-        box-shadow: 0 6px 30px rgba(0, 212, 255, 0.2);
-        border-color: rgba(0, 212, 255, 0.5);
-    }
-    
-    /* Badges de risque avec thème sombre */
-    .risk-badge {
-        display: inline-block;
-        padding: 0.6rem 2rem;
-        border-radius: 30px;
-        font-weight: 700;
-        font-size: 1rem;
-        margin: 0.8rem auto;
-        user-select: none;
-        box-shadow: 0 6px 20px rgba(0, 0, 0, 0.5);
-        transition: all 0.3s ease;
-        border: 2px solid transparent;
-    }
-    
-    .risk-low {
-        background: linear-gradient(135deg, var(--success-color) 0%, #2f855a 100%);
-        color: #f0fff4 !important;
-        border-color: var(--success-color);
-        box-shadow: 0 0 25px rgba(72, 187, 120, 0.5);
-    }
-    
-    .risk-high {
-        background: linear-gradient(135deg, var(--danger-color) 0%, #c53030 100%);
-        color: #fff5f5 !important;
-        border-color: var(--danger-color);
-        box-shadow: 0 0 25px rgba(245, 101, 101, 0.5);
-    }
-    
-    /* Titres de section sombres */
-    .section-title {
-        font-weight: 700;
-        font-size: 1.3rem;
-        margin: 1.2rem 0 1rem 0;
-        color: var(--accent-color) !important;
-        border-bottom: 2px solid var(--accent-color);
-        padding-bottom: 0.5rem;
-        display: flex;
-        align-items: center;
-        gap: 0.5rem;
-        text-shadow: 0 0 8px rgba(0, 212, 255, 0.3);
-    }
-    
-    /* Graphiques SHAP avec fond sombre */
-    .shap-plot {
-        background: var(--card-bg);
-        border-radius: 12px;
-        padding: 1.2rem;
-        box-shadow: 0 6px 25px rgba(0, 0, 0, 0.4);
-        margin-bottom: 1rem;
-        border: 1px solid var(--border-color);
-    }
-    
-    /* Cartes de contenu sombres */
-    .card {
-        background: linear-gradient(135deg, var(--card-bg) 0%, var(--accent-bg) 100%);
-        padding: 1.5rem;
-        border-radius: 16px;
-        color: var(--primary-text) !important;
-        white-space: pre-wrap;
-        box-shadow: 0 6px 25px rgba(0, 0, 0, 0.4);
-        border: 1px solid var(--border-color);
-        font-size: 0.95rem;
-        line-height: 1.7;
-    }
-    
-    /* Formulaire compact sombre */
-    .compact-form {
-        background: linear-gradient(135deg, var(--card-bg) 0%, var(--accent-bg) 100%);
-        padding: 1.5rem;
-        border-radius: 16px;
-        margin-bottom: 1.2rem;
-        box-shadow: 0 6px 25px rgba(0, 0, 0, 0.4);
-        border: 1px solid var(--border-color);
-    }
-    
-    /* Sliders sombres optimisés */
-    .stSlider > div > div > div > div {
-        background: var(--accent-color) !important;
-        height: 4px !important;
-    }
-    
-    .stSlider > div > div > div > div > div {
-        background: var(--accent-color) !important;
-        box-shadow: 0 0 10px rgba(0, 212, 255, 0.5) !important;
-    }
-    
-    .stSlider > div > div > div > div > div[role="slider"] {
-        background-color: var(--accent-color) !important;
-        border: 2px solid var(--primary-text) !important;
-        width: 20px !important;
-        height: 20px !important;
-    }
-    
-    /* Inputs numériques sombres */
-    .stNumberInput > div > div > input {
-        background: var(--input-bg) !important;
-        color: var(--primary-text) !important;
-        border: 2px solid var(--border-color) !important;
-        border-radius: 8px !important;
-        height: 40px !important;
-        font-size: 1rem !important;
-        font-weight: 500 !important;
-    }
-    
-    .stNumberInput > div > div > input:focus {
-        border-color: var(--accent-color) !important;
-        box-shadow: 0 0 10px rgba(0, 212, 255, 0.3) !important;
-    }
-    
-    /* Boutons sombres optimisés */
-    button[kind="primary"] {
-        background: linear-gradient(135deg, var(--accent-color) 0%, #0099cc 100%) !important;
-        color: white !important;
-        font-weight: 600 !important;
-        border-radius: 10px !important;
-        padding: 0.8rem 1.5rem !important;
-        border: none !important;
-        font-size: 1rem !important;
-        transition: all 0.3s ease !important;
-        box-shadow: 0 4px 15px rgba(0, 212, 255, 0.4) !important;
-    }
-    
-    button[kind="primary"]:hover {
-        background: linear-gradient(135deg, #00b8e6 0%, #0077a3 100%) !important;
-        transform: translateY(-2px) !important;
-        box-shadow: 0 6px 25px rgba(0, 212, 255, 0.5) !important;
-    }
-    
-    /* Métriques Streamlit sombres */
-    div[data-testid="metric-container"] {
-        background: linear-gradient(135deg, var(--card-bg) 0%, var(--accent-bg) 100%) !important;
-        border: 2px solid var(--border-color) !important;
-        border-radius: 12px !important;
-        padding: 1.2rem !important;
-        box-shadow: 0 4px 20px rgba(0, 0, 0, 0.3) !important;
-        transition: all 0.3s ease !important;
-    }
-    
-    div[data-testid="metric-container"]:hover {
-        border-color: rgba(0, 212, 255, 0.5) !important;
-        transform: translateY(-2px) !important;
-    }
-    
-    div[data-testid="metric-container"] label {
-        color: var(--secondary-text) !important;
-        font-weight: 600 !important;
-        font-size: 0.9rem !important;
-    }
-    
-    div[data-testid="metric-container"] div[data-testid="metric-value"] {
-        color: var(--accent-color) !important;
-        font-weight: 700 !important;
-        font-size: 1.6rem !important;
-        text-shadow: 0 0 8px rgba(0, 212, 255, 0.3) !important;
-    }
-    
-    /* Labels sombres */
-    label {
-        color: var(--primary-text) !important;
-        font-weight: 600 !important;
-        font-size: 0.95rem !important;
-    }
-    
-    /* Selectbox sombre */
-    .stSelectbox div[data-baseweb="select"] {
-        background-color: var(--input-bg) !important;
-        border: 2px solid var(--border-color) !important;
-    }
-    
-    .stSelectbox div[data-baseweb="select"] span {
-        color: var(--primary-text) !important;
-    }
-    
-    /* Scrollbar sombre */
-    ::-webkit-scrollbar {
-        width: 10px;
-        background: var(--secondary-bg);
-    }
-    
-    ::-webkit-scrollbar-thumb {
-        background: var(--accent-color);
-        border-radius: 6px;
-    }
-    
-    ::-webkit-scrollbar-thumb:hover {
-        background: #00b8e6;
-    }
-    
-    /* Sidebar sombre */
-    .css-1d391kg {
-        background-color: var(--card-bg) !important;
-    }
-    
-    /* Spinners et progress bars sombres */
-    .stSpinner > div {
-        border-top-color: var(--accent-color) !important;
-    }
-    
-    /* Messages d'erreur sombres */
-    .stAlert {
-        background-color: var(--card-bg) !important;
-        border: 1px solid var(--border-color) !important;
-        color: var(--primary-text) !important;
-    }
-    
-    /* Améliorations diverses */
-    .element-container {
-        margin-bottom: 0.8rem !important;
-    }
-    
-    /* Footer sombre */
-    hr {
-        border-color: var(--border-color) !important;
-        margin: 2rem 0 1rem 0 !important;
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(f"<style>{load_theme_css()}</style>", unsafe_allow_html=True)
 
 # -------------------------------
 # Header moderne
@@ -772,13 +657,13 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 # -------------------------------
-# Layout principal en colonnes - TOUT EN TEMPS RÉEL
+# Layout principal en colonnes - CALCUL À LA SOUMISSION DU FORMULAIRE
 # -------------------------------
 col_left, col_right = st.columns([1.2, 1], gap="medium")
 
 with col_left:
-    # Formulaire compact avec mise à jour temps réel
-    with st.container():
+    # Formulaire compact : un seul recalcul par soumission (pas à chaque mouvement de slider)
+    with st.form("client_form"):
         st.markdown(f'<div class="compact-form">', unsafe_allow_html=True)
         st.markdown(f'<div class="section-title">👤 {tr["profile_client"]}</div>', unsafe_allow_html=True)
         
@@ -799,20 +684,35 @@ with col_left:
             late_60 = st.slider(tr["late_60"], 0, 10, 0, key="late_60")
             late_90 = st.slider(tr["late_90"], 0, 10, 0, key="late_90")
         
+        submitted = st.form_submit_button(tr["submit"], type="primary")
         st.markdown('</div>', unsafe_allow_html=True)
 
 # -------------------------------
-# Calculs optimisés avec cache - MIS À JOUR EN TEMPS RÉEL
+# Calculs optimisés avec cache - MIS À JOUR À LA SOUMISSION
 # -------------------------------
+# Les dernières entrées soumises restent valables pour les autres reruns (boutons IA, téléchargements)
+if submitted or "last_inputs" not in st.session_state:
+    st.session_state["last_inputs"] = quantize_inputs(age, income, dependents, open_credit, real_estate, debt_ratio, revolving, late_30, late_60, late_90)
+inputs = st.session_state["last_inputs"]
+age, income, dependents, open_credit, real_estate, debt_ratio, revolving, late_30, late_60, late_90 = inputs
+
 try:
-    client_df, proba, classe = predict_client(age, income, dependents, open_credit, real_estate, debt_ratio, revolving, late_30, late_60, late_90)
-    shap_values, shap_df = compute_shap_values(age, income, dependents, open_credit, real_estate, debt_ratio, revolving, late_30, late_60, late_90)
+    proba, classe, shap_df = analyze_client(*inputs)
 except Exception as e:
     st.error(f"Erreur lors du calcul des prédictions: {str(e)}")
     # Valeurs par défaut en cas d'erreur
     proba, classe = 0.5, 1
     shap_df = pd.DataFrame({'feature': ['age'], 'shap_value': [0.1], 'value': [age]})
 
+# Libellés lisibles calculés une seule fois (Series.map au lieu de replace en chaîne)
+feature_labels = FEATURE_LABELS_FR if lang == "fr" else FEATURE_LABELS_EN
+shap_df["label"] = shap_df["feature"].map(feature_labels).fillna(shap_df["feature"])
+
+# Valeurs formatées une seule fois (affichage, noms de fichiers, debug)
+income_fmt = format(income, ',')
+proba_pct = f"{proba:.1%}"
+proba_pct0 = f"{proba:.0%}"
+
 with col_right:
     # Résultats en temps réel
     st.markdown(f'<div class="section-title">📊 {tr["analysis_result"]}</div>', unsafe_allow_html=True)
@@ -820,7 +720,7 @@ with col_right:
     # Métriques principales
     metric_col1, metric_col2 = st.columns(2)
     with metric_col1:
-        st.metric(tr["default_prob"], f"{proba:.1%}", delta=None)
+        st.metric(tr["default_prob"], proba_pct, delta=None)
     with metric_col2:
         status_text = tr["acceptance"] if classe == 0 else tr["rejection"]
         delta_text = tr["low_risk"] if classe == 0 else tr["high_risk"]
@@ -833,7 +733,7 @@ with col_right:
         st.markdown(f'<div style="text-align:center;"><div class="risk-badge risk-high">{tr["high_risk_badge"]}</div></div>', unsafe_allow_html=True)
 
     # Revenu formaté - MIS À JOUR EN TEMPS RÉEL
-    st.markdown(f'<div class="metric-container"><div class="metric-label">{tr["income"]}</div><div class="metric-value">{income:,} FCFA</div></div>', unsafe_allow_html=True)
+    st.markdown(f'<div class="metric-container"><div class="metric-label">{tr["income"]}</div><div class="metric-value">{income_fmt} FCFA</div></div>', unsafe_allow_html=True)
 
 # -------------------------------
 # Section SHAP optimisée - TEMPS RÉEL AVEC GESTION D'ERREUR
@@ -848,9 +748,7 @@ with shap_col1:
         
         # Graphique SHAP sécurisé - MIS À JOUR EN TEMPS RÉEL
         try:
-            fig = create_safe_shap_plot(shap_values, shap_df)
-            st.pyplot(fig)
-            plt.close(fig)  # LIBÉRATION MÉMOIRE
+            st.image(render_shap_png(shap_df, get_shap_figure()), width="stretch")
         except Exception as e:
             st.error(f"Erreur affichage graphique SHAP: {str(e)}")
             st.info("📊 Les données d'analyse restent disponibles dans l'interprétation à droite.")
@@ -869,20 +767,9 @@ with shap_col2:
         else:
             st.markdown(tr["explanation_low"])
         
-        for _, row in top_features.iterrows():
-            impact_direction = "↗️ augmente" if row['shap_value'] > 0 else "↘️ diminue"
-            feature_display = row['feature'].replace('RevolvingUtilizationOfUnsecuredLines', 'Utilisation crédit renouvelable')
-            feature_display = feature_display.replace('NumberOfTime30-59DaysPastDueNotWorse', 'Retards 30-59 jours')
-            feature_display = feature_display.replace('NumberOfTime60-89DaysPastDueNotWorse', 'Retards 60-89 jours')
-            feature_display = feature_display.replace('NumberOfTimes90DaysLate', 'Retards ≥90 jours')
-            feature_display = feature_display.replace('MonthlyIncome', 'Revenu mensuel')
-            feature_display = feature_display.replace('NumberOfOpenCreditLinesAndLoans', 'Crédits actifs')
-            feature_display = feature_display.replace('NumberRealEstateLoansOrLines', 'Prêts immobiliers')
-            feature_display = feature_display.replace('NumberOfDependents', 'Personnes à charge')
-            feature_display = feature_display.replace('DebtRatio', 'Ratio d\'endettement')
-            feature_display = feature_display.replace('age', 'Âge')
-            
-            st.markdown(f"• **{feature_display}** : {impact_direction} le risque")
+        for row in top_features.itertuples(index=False):
+            impact_direction = "↗️ augmente" if row.shap_value > 0 else "↘️ diminue"
+            st.markdown(f"• **{row.label}** : {impact_direction} le risque")
         
         if classe == 1:
             st.markdown(tr["conclusion_high"])
@@ -903,9 +790,7 @@ ai_col1, ai_col2 = st.columns([2, 1], gap="medium")
 with ai_col1:
     # Rapport automatique en temps réel basé sur les données actuelles
     try:
-        auto_report = generate_auto_ai_report(age, income, dependents, open_credit, real_estate, 
-                                             debt_ratio, revolving, late_30, late_60, late_90, 
-                                             proba, classe, shap_df, lang)
+        auto_report = generate_auto_ai_report(*inputs, proba, classe, shap_df, lang)
         
         st.markdown(f'<div class="card">{auto_report}</div>', unsafe_allow_html=True)
     except Exception as e:
@@ -913,8 +798,8 @@ with ai_col1:
         # Rapport de base en cas d'erreur
         basic_report = f"""📊 RAPPORT D'ANALYSE BASIQUE
         
-🎯 Client: {age} ans, {income:,} FCFA/mois
-📈 Probabilité défaut: {proba:.1%}
+🎯 Client: {age} ans, {income_fmt} FCFA/mois
+📈 Probabilité défaut: {proba_pct}
 🏦 Recommandation: {'REJET' if classe == 1 else 'ACCEPTATION'}"""
         st.markdown(f'<div class="card">{basic_report}</div>', unsafe_allow_html=True)
     
@@ -937,7 +822,7 @@ with ai_col1:
             proba=proba
         )
     except Exception as e:
-        prompt = f"Analysez ce client: {age} ans, {income:,} FCFA/mois, risque {proba:.1%}"
+        prompt = f"Analysez ce client: {age} ans, {income_fmt} FCFA/mois, risque {proba_pct}"
 
     if "texte_ia" not in st.session_state:
         st.session_state["texte_ia"] = None
@@ -948,6 +833,7 @@ with ai_col1:
         else:
             with st.spinner(tr["ai_in_progress"]):
                 try:
+                    import cohere  # Import différé : seulement si le rapport IA est demandé
                     co = cohere.Client(st.secrets["COHERE_API_KEY"])
                     response = co.generate(
                         model="command-r-plus",
@@ -963,114 +849,66 @@ with ai_col1:
         st.markdown("### 🤖 Rapport IA Avancé")
         st.markdown(f'<div class="card">{st.session_state["texte_ia"]}</div>', unsafe_allow_html=True)
 
-with ai_col2:
-    # Boutons de téléchargement optimisés
-    st.markdown("### 📥 Téléchargements")
+# Fragment : téléchargements + score, relancés seuls lors d'un clic sur leurs boutons
+@st.fragment
+def render_export_and_score(inputs, proba, proba_pct0, classe, lang, report_to_export, shap_df):
+    tr = T[lang]
+    age, income = inputs[0], inputs[1]
     
-    # Utiliser le rapport automatique pour les téléchargements
-    try:
-        report_to_export = st.session_state["texte_ia"] if st.session_state["texte_ia"] else auto_report
-    except:
-        report_to_export = f"Rapport client {age} ans - Risque {proba:.1%}"
-    
-    # Génération PDF avec fonction robuste
-    try:
-        pdf_buffer = create_pdf_report(age, income, proba, classe, report_to_export, tr)
-        
-        if pdf_buffer is not None:
-            st.download_button(
-                label=tr["pdf_button"],
-                data=pdf_buffer.getvalue(),
-                file_name=f"rapport_credit_{age}ans_{proba:.0%}_risque.pdf",
-                mime="application/pdf",
-                key="pdf_download"
-            )
-        else:
-            st.error("Erreur génération PDF - Utilisez l'export Excel en alternative")
-    except Exception as e:
-        st.error(f"Erreur PDF: {str(e)}")
-        
-        # Bouton de copie du texte comme alternative
-        st.text_area(
-            "📋 Copiez le rapport manuellement:",
-            value=report_to_export,
-            height=200,
-            key="copy_report",
-            help="Copiez ce texte si le PDF ne fonctionne pas"
+    # Boutons de téléchargement optimisés : repliés par défaut, exports construits au clic
+    with st.expander(tr["downloads"], expanded=False):
+        # Génération PDF différée et mise en cache : construite uniquement au clic sur le bouton
+        report_hash = hashlib.blake2b(report_to_export.encode('utf-8'), digest_size=8).hexdigest()
+
+        def build_pdf():
+            try:
+                return build_pdf_bytes(age, income, proba, classe, lang, report_hash, report_to_export)
+            except Exception:
+                # Repli : PDF minimal avec le texte brut du rapport (une erreur ici est affichée au clic)
+                return create_fallback_pdf(report_to_export)
+
+        st.download_button(
+            label=tr["pdf_button"],
+            data=build_pdf,
+            file_name=f"rapport_credit_{age}ans_{proba_pct0}_risque.pdf",
+            mime="application/pdf",
+            key="pdf_download"
         )
 
-    # Génération Excel optimisée
-    try:
-        df_export = pd.DataFrame([{
-            "Date_Analyse": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M"),
-            tr["age"]: age,
-            tr["income"]: income,
-            tr["debt_ratio"]: debt_ratio,
-            tr["revolving"]: revolving,
-            tr["open_credit"]: open_credit,
-            tr["real_estate"]: real_estate,
-            tr["dependents"]: dependents,
-            tr["late_30"]: late_30,
-            tr["late_60"]: late_60,
-            tr["late_90"]: late_90,
-            tr["default_prob"]: f"{proba:.1%}",
-            tr["recommendation"]: tr["acceptance"] if classe == 0 else tr["rejection"],
-            "Niveau_Risque": tr["low_risk"] if classe == 0 else tr["high_risk"]
-        }])
-        
-        # Ajouter les facteurs SHAP de manière sécurisée
-        try:
-            shap_export = shap_df.head(5).copy()
-            shap_export['feature'] = shap_export['feature'].replace({
-                'RevolvingUtilizationOfUnsecuredLines': 'Utilisation_Credit_Renouvelable',
-                'NumberOfTime30-59DaysPastDueNotWorse': 'Retards_30_59_jours',
-                'NumberOfTime60-89DaysPastDueNotWorse': 'Retards_60_89_jours',
-                'NumberOfTimes90DaysLate': 'Retards_90_jours_plus',
-                'MonthlyIncome': 'Revenu_Mensuel',
-                'NumberOfOpenCreditLinesAndLoans': 'Credits_Actifs',
-                'NumberRealEstateLoansOrLines': 'Prets_Immobiliers',
-                'NumberOfDependents': 'Personnes_Charge',
-                'DebtRatio': 'Ratio_Endettement',
-                'age': 'Age'
-            })
-        except:
-            shap_export = pd.DataFrame({'feature': ['age'], 'shap_value': [0.1], 'value': [age]})
-        
-        excel_buffer = io.BytesIO()
-        with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-            df_export.to_excel(writer, index=False, sheet_name="Resultat_Client")
-            shap_export.to_excel(writer, index=False, sheet_name="Facteurs_Impact")
-        excel_buffer.seek(0)
+        # Génération Excel différée et mise en cache : construite uniquement au clic sur le bouton
+        # Seules les colonnes exportées sont lues (la colonne 'label' d'affichage est exclue)
+        shap_top = tuple(shap_df.iloc[:5][['feature', 'shap_value', 'value']].itertuples(index=False, name=None))
+
+        # Pas de try/except : Streamlit affiche l'erreur au clic plutôt que de servir un fichier vide
+        def build_xlsx():
+            analysis_date = datetime.now().strftime("%Y-%m-%d %H:%M")
+            return build_xlsx_bytes(inputs, proba, classe, lang, shap_top, analysis_date)
 
         st.download_button(
             label=tr["excel_button"],
-            data=excel_buffer,
-            file_name=f"analyse_credit_{age}ans_{proba:.0%}_risque.xlsx",
+            data=build_xlsx,
+            file_name=f"analyse_credit_{age}ans_{proba_pct0}_risque.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             key="excel_download"
         )
-    except Exception as e:
-        st.error(f"Erreur génération Excel: {str(e)}")
 
     # Score de santé financière simplifié
     st.markdown("### 📊 Score de Santé")
     
     try:
-        score_sante = (1 - proba) * 100
-        if score_sante >= 80:
-            score_color = "🟢"
-            score_text = "Excellent"
-        elif score_sante >= 60:
-            score_color = "🟡"
-            score_text = "Correct"
-        else:
-            score_color = "🔴"
-            score_text = "Faible"
-        
-        st.markdown(f'<div class="metric-container"><div class="metric-label">Score Financier</div><div class="metric-value">{score_color} {score_sante:.0f}/100</div><div style="color: var(--secondary-text); font-size: 0.8rem; margin-top: 0.3rem;">{score_text}</div></div>', unsafe_allow_html=True)
+        st.markdown(score_html(round(proba, 3)), unsafe_allow_html=True)
     except Exception as e:
         st.markdown(f'<div class="metric-container"><div class="metric-label">Score Financier</div><div class="metric-value">🔴 Erreur calcul</div></div>', unsafe_allow_html=True)
 
+with ai_col2:
+    # Utiliser le rapport automatique pour les téléchargements
+    try:
+        report_to_export = st.session_state["texte_ia"] if st.session_state["texte_ia"] else auto_report
+    except:
+        report_to_export = f"Rapport client {age} ans - Risque {proba_pct}"
+    
+    render_export_and_score(inputs, proba, proba_pct0, classe, lang, report_to_export, shap_df)
+
 # -------------------------------
 # Footer simplifié
 # -------------------------------
@@ -1078,7 +916,7 @@ st.markdown("---")
 footer_col1, footer_col2 = st.columns(2)
 
 with footer_col1:
-    st.markdown(f"**⚡ Analyse en temps réel** - Mise à jour automatique")
+    st.markdown(f"**⚡ Analyse à la demande** - Mise à jour à chaque soumission")
 
 with footer_col2:
     st.markdown(f"**🎯 Modèle XGBoost** - Précision optimisée")
@@ -1086,24 +924,34 @@ with footer_col2:
 # -------------------------------
 # Debug optionnel dans la sidebar avec gestion d'erreur
 # -------------------------------
-if st.sidebar.checkbox("🔧 Infos Debug", value=False):
-    st.sidebar.markdown("### 🚀 Performance")
-    try:
-        st.sidebar.markdown(f"**Modèle:** ✅ Chargé")
-        st.sidebar.markdown(f"**Cache SHAP:** ✅ Actif")
-        st.sidebar.markdown(f"**Proba:** {proba:.3f}")
-        st.sidebar.markdown(f"**Classe:** {classe}")
-        st.sidebar.markdown(f"**Top facteur:** {shap_df.iloc[0]['feature'][:20]}...")
-        st.sidebar.markdown(f"**Impact:** {shap_df.iloc[0]['shap_value']:.3f}")
-        
-        # Données actuelles
-        st.sidebar.markdown("### 📊 Données")
-        st.sidebar.json({
-            "age": age,
-            "income_fcfa": f"{income:,}",
-            "probability": f"{proba:.1%}",
-            "risk": "HIGH" if classe == 1 else "LOW"
-        })
-    except Exception as e:
-        st.sidebar.error(f"Erreur debug: {str(e)}")
-        st.sidebar.markdown("**Status:** ⚠️ Données partielles disponibles")
+# Fragment : cocher/décocher le debug ne relance que ce panneau, pas toute l'application
+@st.fragment
+def render_debug_panel(age, income_fmt, proba, proba_pct, classe, shap_df):
+    if st.checkbox("🔧 Infos Debug", value=False):
+        st.markdown("### 🚀 Performance")
+        try:
+            # Accès scalaires directs (.iat) au lieu de iloc[0][...] qui construit une Series
+            top_feature = shap_df['feature'].iat[0]
+            top_value = shap_df['shap_value'].iat[0]
+            st.markdown(f"**Modèle:** ✅ Chargé")
+            st.markdown(f"**Cache SHAP:** ✅ Actif")
+            st.markdown(f"**Proba:** {proba:.3f}")
+            st.markdown(f"**Classe:** {classe}")
+            st.markdown(f"**Top facteur:** {top_feature[:20]}...")
+            st.markdown(f"**Impact:** {top_value:.3f}")
+            
+            # Données actuelles
+            st.markdown("### 📊 Données")
+            st.markdown(
+                f"- age: {age}\n"
+                f"- income_fcfa: {income_fmt}\n"
+                f"- probability: {proba_pct}\n"
+                f"- risk: {'HIGH' if classe == 1 else 'LOW'}"
+            )
+        except Exception as e:
+            st.error(f"Erreur debug: {str(e)}")
+            st.markdown("**Status:** ⚠️ Données partielles disponibles")
+
+# Un fragment ne peut pas écrire dans st.sidebar : il est appelé depuis le contexte de la sidebar
+with st.sidebar:
+    render_debug_panel(age, income_fmt, proba, proba_pct, classe, shap_df)